@@ -1,27 +1,62 @@
 """Databricks User Group Manager Application."""
 import logging
+import os
+import re
 import sys
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Set
 from datetime import datetime
-
-from databricks.sdk import WorkspaceClient
-from databricks.sdk.service.iam import Group, User, ComplexValue
+from concurrent.futures import Future, wait
 
 from auth import AuthService
 from group_manager import GroupManager
-from config import settings
+from config import get_settings
+from logging_setup import setup_queued_logging
+
+# Set up logging; records are queued and written by a background listener thread
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [
+    logging.StreamHandler(sys.stdout),
+    logging.FileHandler('user_group_manager.log')
+]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
 
-# Set up logging
-logging.basicConfig(
-    level=settings.LOG_LEVEL,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('user_group_manager.log')
-    ]
-)
+# Read from the environment so importing this module doesn't load and validate settings;
+# main() applies Settings.LOG_LEVEL once settings are loaded
+setup_queued_logging(*log_handlers, level=os.environ.get('LOG_LEVEL', 'INFO'))
 logger = logging.getLogger(__name__)
 
+# Matches a single group number or a range such as "3-7" in a selection
+_SELECTION_PATTERN = re.compile(r'\s*(\d+)\s*(?:-\s*(\d+)\s*)?')
+
+def parse_selection(selection: str, count: int) -> List[int]:
+    """
+    Parse a selection like "1,3,5-7" into zero-based indices.
+    
+    Args:
+        selection: Comma-separated group numbers and ranges
+        count: Number of groups on offer; numbers beyond it are dropped
+        
+    Returns:
+        List of distinct zero-based indices in the order first given
+        
+    Raises:
+        ValueError: If an entry is not a group number or an ascending range
+    """
+    indices = []
+    for part in selection.split(','):
+        match = _SELECTION_PATTERN.fullmatch(part)
+        if not match:
+            raise ValueError(f"Invalid selection entry: '{part.strip()}'")
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        if last < first:
+            raise ValueError(f"Invalid selection range: '{part.strip()}'")
+        indices.extend(range(max(first, 1) - 1, min(last, count)))
+    # Overlapping entries would otherwise select the same group twice
+    return list(dict.fromkeys(indices))
+
 class UserGroupManagerApp:
     """Main application class for managing user groups in Databricks."""
     
@@ -30,10 +65,38 @@ class UserGroupManagerApp:
         self.auth_service = AuthService()
         self.group_manager = GroupManager(self.auth_service)
         self.logger = logging.getLogger(__name__)
+        self._prefetch: Optional[Future] = None
+    
+    def prefetch_manageable_groups(self):
+        """Warm the manageable groups cache in the background for the next action."""
+        if self._prefetch is not None and not self._prefetch.done():
+            return
+        future = Future()
+        
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self.group_manager.list_manageable_groups())
+            except Exception as e:
+                future.set_exception(e)
+        
+        # A daemon thread, so exiting never waits for a sweep still in progress
+        threading.Thread(target=run, name="prefetch-groups", daemon=True).start()
+        self._prefetch = future
+    
+    def close(self):
+        """Stop background prefetching."""
+        if self._prefetch is not None:
+            self._prefetch.cancel()
     
     def get_manageable_groups(self) -> List[Dict[str, str]]:
         """Get a list of groups that the current user can manage."""
         self.logger.info("Fetching manageable groups...")
+        # The cache doesn't share a lookup in progress, so wait for the prefetch
+        # instead of starting a second permission sweep alongside it
+        if self._prefetch is not None:
+            wait([self._prefetch])
         return self.group_manager.list_manageable_groups()
     
     def get_group_members(self, group_name: str) -> List[Dict[str, str]]:
@@ -41,33 +104,38 @@ class UserGroupManagerApp:
         self.logger.info(f"Fetching members of group: {group_name}")
         return self.group_manager.get_group_members(group_name)
     
-    def add_user_to_groups(self, user_email: str, group_names: List[str]) -> Dict[str, Any]:
+    def get_user_group_ids(self, user_email: str) -> Set[str]:
+        """Get the IDs of the groups a user belongs to."""
+        self.logger.info(f"Fetching group memberships of user: {user_email}")
+        return self.group_manager.get_user_group_ids(user_email)
+    
+    def add_user_to_groups(self, user_email: str, group_ids: List[str]) -> Dict[str, Any]:
         """
         Add a user to one or more groups.
         
         Args:
             user_email: Email of the user to add
-            group_names: List of group names to add the user to
+            group_ids: List of IDs of the groups to add the user to
             
         Returns:
-            Dictionary with operation results
+            Dictionary with operation results, keyed by group ID
         """
-        self.logger.info(f"Adding user {user_email} to groups: {', '.join(group_names)}")
-        return self.group_manager.add_user_to_groups(user_email, group_names)
+        self.logger.info(f"Adding user {user_email} to groups: {', '.join(group_ids)}")
+        return self.group_manager.add_user_to_groups(user_email, group_ids)
     
-    def remove_user_from_groups(self, user_email: str, group_names: List[str]) -> Dict[str, Any]:
+    def remove_user_from_groups(self, user_email: str, group_ids: List[str]) -> Dict[str, Any]:
         """
         Remove a user from one or more groups.
         
         Args:
             user_email: Email of the user to remove
-            group_names: List of group names to remove the user from
+            group_ids: List of IDs of the groups to remove the user from
             
         Returns:
-            Dictionary with operation results
+            Dictionary with operation results, keyed by group ID
         """
-        self.logger.info(f"Removing user {user_email} from groups: {', '.join(group_names)}")
-        return self.group_manager.remove_user_from_groups(user_email, group_names)
+        self.logger.info(f"Removing user {user_email} from groups: {', '.join(group_ids)}")
+        return self.group_manager.remove_user_from_groups(user_email, group_ids)
     
     def display_manageable_groups(self):
         """Display a list of groups the current user can manage."""
@@ -77,11 +145,10 @@ class UserGroupManagerApp:
                 print("No manageable groups found or you don't have permissions to any groups.")
                 return
                 
-            print("\nManageable Groups:")
-            print("-" * 50)
-            for i, group in enumerate(groups, 1):
-                print(f"{i}. {group['displayName']} (ID: {group['id']})")
-            print("")
+            lines = ["\nManageable Groups:", "-" * 50]
+            lines += [f"{i}. {group['displayName']} (ID: {group['id']})"
+                      for i, group in enumerate(groups, 1)]
+            sys.stdout.write("\n".join(lines) + "\n\n")
             
         except Exception as e:
             self.logger.error(f"Failed to display manageable groups: {str(e)}")
@@ -95,11 +162,11 @@ class UserGroupManagerApp:
                 print(f"No members found in group '{group_name}' or group does not exist.")
                 return
                 
-            print(f"\nMembers of group '{group_name}':")
-            print("-" * 50)
-            for i, member in enumerate(members, 1):
-                print(f"{i}. {member.get('displayName', 'N/A')} ({member.get('userName', 'N/A')})")
-            print("")
+            lines = [f"\nMembers of group '{group_name}':", "-" * 50]
+            lines += [f"{i}. {member.get('displayName', 'N/A')} ({member.get('userName', 'N/A')})"
+                      for i, member in enumerate(members, 1)]
+            sys.stdout.write("\n".join(lines) + "\n\n")
+            self.prefetch_manageable_groups()
             
         except Exception as e:
             self.logger.error(f"Failed to display group members: {str(e)}")
@@ -120,29 +187,30 @@ class UserGroupManagerApp:
                 print("No manageable groups found. You don't have permissions to add users to any groups.")
                 return
             
+            group_names = {group['id']: group['displayName'] for group in groups}
+            
             # Display groups
-            print("\nAvailable Groups (you have permission to manage):")
-            for i, group in enumerate(groups, 1):
-                print(f"{i}. {group['displayName']}")
+            lines = ["\nAvailable Groups (you have permission to manage):"]
+            lines += [f"{i}. {group['displayName']}" for i, group in enumerate(groups, 1)]
+            sys.stdout.write("\n".join(lines) + "\n")
             
             # Get group selection
-            selection = input("\nEnter group numbers to add the user to (comma-separated, e.g., 1,3,5): ").strip()
+            selection = input("\nEnter group numbers to add the user to (comma-separated or ranges, e.g., 1,3,5-7): ").strip()
             try:
-                selected_indices = [int(idx.strip()) - 1 for idx in selection.split(',')]
-                selected_groups = [groups[idx]['displayName'] for idx in selected_indices 
-                                 if 0 <= idx < len(groups)]
-            except (ValueError, IndexError):
+                selected_indices = parse_selection(selection, len(groups))
+            except ValueError:
                 print("Invalid selection. Please enter valid group numbers.")
                 return
+            selected_ids = [groups[idx]['id'] for idx in selected_indices]
             
-            if not selected_groups:
+            if not selected_ids:
                 print("No valid groups selected.")
                 return
             
             # Confirm and execute
             print(f"\nYou are about to add user '{user_email}' to the following groups:")
-            for group in selected_groups:
-                print(f"- {group}")
+            for group_id in selected_ids:
+                print(f"- {group_names[group_id]}")
             
             confirm = input("\nDo you want to proceed? (y/n): ").strip().lower()
             if confirm != 'y':
@@ -150,7 +218,7 @@ class UserGroupManagerApp:
                 return
             
             # Add user to groups
-            results = self.add_user_to_groups(user_email, selected_groups)
+            results = self.add_user_to_groups(user_email, selected_ids)
             
             # Display results
             print("\nOperation Results:")
@@ -158,17 +226,17 @@ class UserGroupManagerApp:
             if results['success']:
                 print("\nSuccessfully added to:")
                 for item in results['success']:
-                    print(f"- {item['group']} ({item['status']})")
+                    print(f"- {group_names.get(item['group'], item['group'])} ({item['status']})")
             
             if results['failed']:
                 print("\nFailed to add to:")
                 for item in results['failed']:
-                    print(f"- {item['group']}: {item['reason']}")
+                    print(f"- {group_names.get(item['group'], item['group'])}: {item['reason']}")
             
             if results['unauthorized']:
                 print("\nNot authorized to manage these groups:")
-                for group in results['unauthorized']:
-                    print(f"- {group}")
+                for group_id in results['unauthorized']:
+                    print(f"- {group_names.get(group_id, group_id)}")
             
             print("")
             
@@ -192,43 +260,41 @@ class UserGroupManagerApp:
                 return
             
             # Find groups where the user is a member
-            user_groups = []
-            for group in groups:
-                members = self.get_group_members(group['displayName'])
-                if any(member.get('userName') == user_email for member in members):
-                    user_groups.append(group)
+            member_group_ids = self.get_user_group_ids(user_email)
+            user_groups = [group for group in groups if group['id'] in member_group_ids]
             
             if not user_groups:
                 print(f"User '{user_email}' is not a member of any groups you can manage.")
                 return
             
+            group_names = {group['id']: group['displayName'] for group in user_groups}
+            
             # Display groups
-            print(f"\nGroups containing user '{user_email}' that you can manage:")
-            for i, group in enumerate(user_groups, 1):
-                print(f"{i}. {group['displayName']}")
+            lines = [f"\nGroups containing user '{user_email}' that you can manage:"]
+            lines += [f"{i}. {group['displayName']}" for i, group in enumerate(user_groups, 1)]
+            sys.stdout.write("\n".join(lines) + "\n")
             
             # Get group selection
-            selection = input("\nEnter group numbers to remove the user from (comma-separated, e.g., 1,3,5 or 'all'): ").strip().lower()
+            selection = input("\nEnter group numbers to remove the user from (comma-separated or ranges, e.g., 1,3,5-7 or 'all'): ").strip().lower()
             
             if selection == 'all':
-                selected_groups = [group['displayName'] for group in user_groups]
+                selected_ids = [group['id'] for group in user_groups]
             else:
                 try:
-                    selected_indices = [int(idx.strip()) - 1 for idx in selection.split(',')]
-                    selected_groups = [user_groups[idx]['displayName'] for idx in selected_indices 
-                                     if 0 <= idx < len(user_groups)]
-                except (ValueError, IndexError):
+                    selected_indices = parse_selection(selection, len(user_groups))
+                except ValueError:
                     print("Invalid selection. Please enter valid group numbers or 'all'.")
                     return
+                selected_ids = [user_groups[idx]['id'] for idx in selected_indices]
             
-            if not selected_groups:
+            if not selected_ids:
                 print("No valid groups selected.")
                 return
             
             # Confirm and execute
             print(f"\nYou are about to remove user '{user_email}' from the following groups:")
-            for group in selected_groups:
-                print(f"- {group}")
+            for group_id in selected_ids:
+                print(f"- {group_names[group_id]}")
             
             confirm = input("\nDo you want to proceed? This action cannot be undone. (y/n): ").strip().lower()
             if confirm != 'y':
@@ -236,7 +302,7 @@ class UserGroupManagerApp:
                 return
             
             # Remove user from groups
-            results = self.remove_user_from_groups(user_email, selected_groups)
+            results = self.remove_user_from_groups(user_email, selected_ids)
             
             # Display results
             print("\nOperation Results:")
@@ -244,17 +310,17 @@ class UserGroupManagerApp:
             if results['success']:
                 print("\nSuccessfully removed from:")
                 for item in results['success']:
-                    print(f"- {item['group']} ({item['status']})")
+                    print(f"- {group_names.get(item['group'], item['group'])} ({item['status']})")
             
             if results['failed']:
                 print("\nFailed to remove from:")
                 for item in results['failed']:
-                    print(f"- {item['group']}: {item['reason']}")
+                    print(f"- {group_names.get(item['group'], item['group'])}: {item['reason']}")
             
             if results['unauthorized']:
                 print("\nNot authorized to manage these groups:")
-                for group in results['unauthorized']:
-                    print(f"- {group}")
+                for group_id in results['unauthorized']:
+                    print(f"- {group_names.get(group_id, group_id)}")
             
             print("")
             
@@ -264,7 +330,9 @@ class UserGroupManagerApp:
 
 def main():
     """Main entry point for the application."""
+    app = None
     try:
+        logging.getLogger().setLevel(get_settings().LOG_LEVEL)
         app = UserGroupManagerApp()
         
         while True:
@@ -305,6 +373,9 @@ def main():
         logger.critical(f"Critical error: {str(e)}", exc_info=True)
         print(f"\nA critical error occurred: {str(e)}")
         print("Please check the logs for more details.")
+    finally:
+        if app is not None:
+            app.close()
 
 if __name__ == "__main__":
     main()
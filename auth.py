@@ -1,81 +1,132 @@
 """Authentication and authorization service for Databricks User Group Manager."""
 from databricks.sdk import WorkspaceClient
 from databricks.sdk.core import Config
-from azure.identity import ClientSecretCredential
-from azure.keyvault.secrets import SecretClient
 from typing import Optional, Dict, Any
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from cachetools import TTLCache
 import logging
+import threading
 
-from config import settings
+from config import get_settings
+from retry import retry_with_backoff, read_limiter
+from scim import scim_eq
+
+# Connection pool shared by every WorkspaceClient, so the user and service
+# principal clients reuse the same TLS connections to the workspace. Retries
+# are left to the SDK and retry_with_backoff, which honour Retry-After.
+_http_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+
+def share_connection_pool(client: WorkspaceClient) -> WorkspaceClient:
+    """Mount the shared connection pool on the client's HTTP session."""
+    api_client = getattr(client.api_client, '_api_client', client.api_client)
+    session = getattr(api_client, '_session', None)
+    if session is not None:
+        session.mount("https://", _http_adapter)
+    return client
+
+@lru_cache(maxsize=None)
+def _service_principal_client(host: str, client_id: str) -> WorkspaceClient:
+    """Build one WorkspaceClient per (host, client_id) and reuse it."""
+    return share_connection_pool(WorkspaceClient(config=Config(
+        host=host,
+        client_id=client_id,
+        client_secret=get_settings().SERVICE_PRINCIPAL_SECRET.get_secret_value()
+    )))
 
 class AuthService:
     """Handles authentication and authorization for the application."""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self._service_principal_creds = None
+        self._can_manage_by_group_id = TTLCache(maxsize=1024, ttl=60)  # Manage rights per group ID
+        self._can_manage_lock = threading.Lock()
+        self._group_id_by_name: Dict[str, str] = {}
+    
+    @property
+    def user_id(self) -> str:
+        """ID of the current user, resolved once per session."""
+        return self._me_cached().id
         
+    @lru_cache(maxsize=1)
     def get_user_client(self) -> WorkspaceClient:
         """Get a Databricks workspace client authenticated as the current user."""
-        return WorkspaceClient()
-    
-    def _get_service_principal_credentials(self) -> Dict[str, str]:
-        """Retrieve service principal credentials from Azure Key Vault."""
-        if not self._service_principal_creds:
-            try:
-                credential = ClientSecretCredential(
-                    tenant_id=settings.TENANT_ID,
-                    client_id=settings.SERVICE_PRINCIPAL_CLIENT_ID,
-                    client_secret=settings.SERVICE_PRINCIPAL_SECRET.get_secret_value()
-                )
-                
-                key_vault_url = f"https://{settings.KEY_VAULT_NAME}.vault.azure.net"
-                client = SecretClient(vault_url=key_vault_url, credential=credential)
-                
-                self._service_principal_creds = {
-                    'client_id': settings.SERVICE_PRINCIPAL_CLIENT_ID,
-                    'client_secret': settings.SERVICE_PRINCIPAL_SECRET.get_secret_value(),
-                    'tenant_id': settings.TENANT_ID
-                }
-                
-            except Exception as e:
-                self.logger.error(f"Failed to retrieve service principal credentials: {str(e)}")
-                raise
-                
-        return self._service_principal_creds
+        return share_connection_pool(WorkspaceClient(profile=get_settings().DATABRICKS_PROFILE))
     
     def get_service_principal_client(self) -> WorkspaceClient:
         """Get a Databricks workspace client authenticated as the service principal."""
         try:
-            creds = self._get_service_principal_credentials()
-            config = Config(
-                host=settings.DATABRICKS_WORKSPACE_URL,
-                client_id=creds['client_id'],
-                client_secret=creds['client_secret']
-            )
-            return WorkspaceClient(config=config)
+            settings = get_settings()
+            return _service_principal_client(settings.DATABRICKS_WORKSPACE_URL, settings.SERVICE_PRINCIPAL_CLIENT_ID)
         except Exception as e:
             self.logger.error(f"Failed to create service principal client: {str(e)}")
             raise
     
-    def can_manage_group(self, user_client: WorkspaceClient, group_name: str) -> bool:
-        """Check if the current user has permissions to manage the specified group."""
+    @lru_cache(maxsize=1)
+    @retry_with_backoff()
+    @read_limiter
+    def _me_cached(self):
+        """Fetch the current user from the SCIM Me endpoint, once per session."""
+        return self.get_user_client().current_user.me()
+    
+    @retry_with_backoff()
+    @read_limiter
+    def _fetch_group_id(self, user_client: WorkspaceClient, group_name: str) -> Optional[str]:
+        """Resolve a group display name to its ID with a server-side filter."""
+        group = next(iter(user_client.groups.list(
+            filter=scim_eq("displayName", group_name),
+            attributes="id"
+        )), None)
+        return group.id if group else None
+    
+    @retry_with_backoff()
+    @read_limiter
+    def _fetch_can_manage(self, user_client: WorkspaceClient, group_id: str) -> bool:
+        """Check the group's access control list for admin or manage permissions held by the current user."""
+        me = self._me_cached()
+        my_groups = {g.display for g in (me.groups or [])}
+        group_permissions = user_client.permissions.get("groups", group_id)
+        
+        for acl in (group_permissions.access_control_list or []):
+            # Only entries granted to the current user or one of their groups count
+            if acl.user_name != me.user_name and acl.group_name not in my_groups:
+                continue
+            for perm in (acl.all_permissions or []):
+                level = getattr(perm.permission_level, 'value', perm.permission_level)
+                if level in ['ADMIN', 'MANAGE', 'CAN_MANAGE']:
+                    return True
+        return False
+    
+    def get_group_id(self, user_client: WorkspaceClient, group_name: str) -> Optional[str]:
+        """Resolve a group display name to its ID, memoized per session."""
+        if group_name not in self._group_id_by_name:
+            group_id = self._fetch_group_id(user_client, group_name)
+            if group_id is None:
+                return None
+            self._group_id_by_name[group_name] = group_id
+        return self._group_id_by_name[group_name]
+    
+    def forget_group_id(self, group_name: str):
+        """Drop a remembered group ID, e.g. after the group was deleted or recreated."""
+        self._group_id_by_name.pop(group_name, None)
+    
+    def can_manage_group_id(self, user_client: WorkspaceClient, group_id: str,
+                            use_cache: bool = True) -> bool:
+        """
+        Check if the current user has permissions to manage the group with this ID.
+        
+        Answers are remembered for a minute; pass use_cache=False to read the
+        group's access control list again before acting on it.
+        """
         try:
-            # Get the current user's groups
-            current_user = user_client.current_user.me()
-            user_groups = user_client.groups.list(attributes="id,displayName")
-            
-            # Check if user is an admin or owner of the group
-            for group in user_groups:
-                if group.display_name == group_name:
-                    # Check group permissions using the Permissions API
-                    # Note: This is a simplified check - you might need to adjust based on your exact permission model
-                    group_permissions = user_client.permissions.get("groups", group.id)
-                    # Check if user has admin or manage permissions on the group
-                    # This is a placeholder - adjust based on your permission model
-                    return any(perm.permission_level in ['ADMIN', 'MANAGE'] 
-                             for perm in group_permissions.access_control_list)
-            return False
+            if use_cache:
+                with self._can_manage_lock:
+                    if group_id in self._can_manage_by_group_id:
+                        return self._can_manage_by_group_id[group_id]
+            allowed = self._fetch_can_manage(user_client, group_id)
+            with self._can_manage_lock:
+                self._can_manage_by_group_id[group_id] = allowed
+            return allowed
             
         except Exception as e:
             self.logger.error(f"Failed to check group management permissions: {str(e)}")
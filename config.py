@@ -1,21 +1,27 @@
-from pydantic import BaseSettings, Field, SecretStr
+from functools import lru_cache
+from pydantic import Field, SecretStr
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
 class Settings(BaseSettings):
     # Azure Key Vault settings
-    KEY_VAULT_NAME: str = Field(..., env='KEY_VAULT_NAME')
-    SERVICE_PRINCIPAL_CLIENT_ID: str = Field(..., env='SERVICE_PRINCIPAL_CLIENT_ID')
-    SERVICE_PRINCIPAL_SECRET: SecretStr = Field(..., env='SERVICE_PRINCIPAL_SECRET')
-    TENANT_ID: str = Field(..., env='TENANT_ID')
+    KEY_VAULT_NAME: str = Field(...)
+    SERVICE_PRINCIPAL_CLIENT_ID: str = Field(...)
+    SERVICE_PRINCIPAL_SECRET: SecretStr = Field(...)
+    TENANT_ID: str = Field(...)
     
     # Databricks workspace URL (e.g., https://adb-1234567890123456.16.azuredatabricks.net/)
-    DATABRICKS_WORKSPACE_URL: str = Field(..., env='DATABRICKS_WORKSPACE_URL')
+    DATABRICKS_WORKSPACE_URL: str = Field(...)
+    
+    # Databricks config profile; skips auth auto-detection when set
+    DATABRICKS_PROFILE: Optional[str] = Field(None)
     
     # Logging configuration
-    LOG_LEVEL: str = Field('INFO', env='LOG_LEVEL')
+    LOG_LEVEL: str = Field('INFO')
     
-    class Config:
-        env_file = '.env'
-        env_file_encoding = 'utf-8'
-        
-settings = Settings()
+    model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8')
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load settings from the environment on first use and reuse them."""
+    return Settings()
@@ -1,98 +1,197 @@
 import logging
-from typing import List, Dict, Optional
+import os
+from typing import List, Dict, Optional, Callable, Iterator
 from databricks.sdk import WorkspaceClient
 from databricks.sdk.service import iam
 from databricks.sdk.core import Config
-from azure.identity import ClientSecretCredential
-from azure.keyvault.secrets import SecretClient
+from databricks.sdk.errors import TooManyRequests, TemporarilyUnavailable, DeadlineExceeded, InternalError
 from datetime import datetime
-import json
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from cachetools import TTLCache
 
-from config import settings
+from auth import share_connection_pool
+from config import get_settings
+from logging_setup import setup_queued_logging
+from retry import retry_with_backoff, read_limiter
+from scim import scim_eq
+
+# Configure logging; records are queued and written by a background listener thread,
+# which keeps handlers the host set up on the root logger receiving audit entries.
+# The level comes from the environment so importing this module doesn't load settings;
+# Settings.LOG_LEVEL is applied when the service is created.
+setup_queued_logging(level=os.environ.get('LOG_LEVEL', 'INFO'))
 
-# Configure logging
-logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
+# Refresh the service principal token this many seconds before it expires
+TOKEN_REFRESH_MARGIN_SECS = 300
+
+SCIM_GROUPS_PATH = "/api/2.0/preview/scim/v2/Groups"
+
+# SCIM errors worth retrying: 429, 503, 504 and other transient 5xx
+TRANSIENT_ERRORS = (TooManyRequests, TemporarilyUnavailable, DeadlineExceeded, InternalError)
+
+def _build_pooled_client(**kwargs) -> WorkspaceClient:
+    """Build a WorkspaceClient that uses the shared HTTP connection pool."""
+    return share_connection_pool(WorkspaceClient(**kwargs))
+
 class DatabricksGroupService:
     """Service for managing Databricks group memberships with proper security controls."""
     
     def __init__(self):
-        self._user_client = WorkspaceClient()  # Client using current user's credentials
+        settings = get_settings()
+        logging.getLogger().setLevel(settings.LOG_LEVEL)
+        
+        # Client using current user's credentials
+        self._user_client = _build_pooled_client(profile=settings.DATABRICKS_PROFILE)
         self._service_principal_client = None
+        self._sp_credential = None
+        self._sp_token = None  # (token, expires_on epoch seconds)
+        self._sp_client_token = None  # Token the current service principal client was built with
+        self._group_access = TTLCache(maxsize=1024, ttl=60)  # Group IDs the user may manage
+        self._group_access_lock = threading.Lock()
+        
+    def _get_sp_token(self) -> str:
+        """Get an AAD token for the service principal, refreshed shortly before it expires."""
+        if self._sp_token is None or time.time() >= self._sp_token[1] - TOKEN_REFRESH_MARGIN_SECS:
+            if self._sp_credential is None:
+                from azure.identity import ClientSecretCredential
+                
+                # Get service principal credentials from Azure Key Vault
+                settings = get_settings()
+                self._sp_credential = ClientSecretCredential(
+                    tenant_id=settings.TENANT_ID,
+                    client_id=settings.SERVICE_PRINCIPAL_CLIENT_ID,
+                    client_secret=settings.SERVICE_PRINCIPAL_SECRET.get_secret_value()
+                )
+            
+            access_token = self._sp_credential.get_token("https://management.azure.com/.default")
+            self._sp_token = (access_token.token, access_token.expires_on)
+        return self._sp_token[0]
         
     def _get_service_principal_client(self) -> WorkspaceClient:
         """Get a Databricks client authenticated as the service principal."""
-        if self._service_principal_client is None:
-            # Get service principal credentials from Azure Key Vault
-            credential = ClientSecretCredential(
-                tenant_id=settings.TENANT_ID,
-                client_id=settings.SERVICE_PRINCIPAL_CLIENT_ID,
-                client_secret=settings.SERVICE_PRINCIPAL_SECRET.get_secret_value()
-            )
-            
-            self._service_principal_client = WorkspaceClient(
-                host=settings.DATABRICKS_WORKSPACE_URL,
-                token=credential.get_token("https://management.azure.com/.default").token
+        token = self._get_sp_token()
+        if self._service_principal_client is None or token != self._sp_client_token:
+            self._service_principal_client = _build_pooled_client(
+                host=get_settings().DATABRICKS_WORKSPACE_URL,
+                token=token
             )
+            self._sp_client_token = token
         return self._service_principal_client
     
+    @read_limiter
+    def _probe_group(self, group_id: str):
+        """Fetch a group as the current user, raising if they can't access it."""
+        # Only the ID is needed; the full group would include every member
+        self._user_client.api_client.do(
+            "GET", f"{SCIM_GROUPS_PATH}/{group_id}", query={"attributes": "id"}
+        )
+    
+    def _verify_group_access(self, group_id: str):
+        """
+        Raise if the current user has no permission to manage members of a group.
+        
+        Successful checks are remembered briefly so repeated actions on the
+        same group skip the probe.
+        """
+        with self._group_access_lock:
+            if group_id in self._group_access:
+                return
+        self._probe_group(group_id)
+        with self._group_access_lock:
+            self._group_access[group_id] = True
+    
+    def _can_access_group(self, group: iam.Group) -> bool:
+        """Check if the current user has permission to manage members of a group."""
+        try:
+            self._verify_group_access(group.id)
+            return True
+        except Exception as e:
+            logger.debug(f"Skipping group {group.display_name}: {str(e)}")
+            return False
+    
     def get_available_groups(self) -> List[Dict]:
         """Get list of groups that the current user has permissions to manage."""
         try:
-            groups = []
-            for group in self._user_client.groups.list():
-                try:
-                    # Check if user has permission to manage members
-                    self._user_client.groups.get(group.id)
-                    groups.append({
-                        'id': group.id,
-                        'display_name': group.display_name,
-                        'url': f"{settings.DATABRICKS_WORKSPACE_URL}/#setting/accounts/groups/{group.id}"
-                    })
-                except Exception as e:
-                    logger.debug(f"Skipping group {group.display_name}: {str(e)}")
-                    continue
-            return groups
+            all_groups = list(self._user_client.groups.list(attributes="id,displayName", count=200))
+            
+            # Permissions are not part of the list payload, so probe all groups concurrently
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                accessible = list(executor.map(self._can_access_group, all_groups))
+            
+            workspace_url = get_settings().DATABRICKS_WORKSPACE_URL
+            return [{
+                'id': group.id,
+                'display_name': group.display_name,
+                'url': f"{workspace_url}/#setting/accounts/groups/{group.id}"
+            } for group, allowed in zip(all_groups, accessible) if allowed]
         except Exception as e:
             logger.error(f"Error fetching groups: {str(e)}")
             raise
     
-    def get_group_members(self, group_id: str) -> List[Dict]:
-        """Get list of members in a specific group."""
+    def get_group_members(self, group_id: str) -> Iterator[Dict]:
+        """Stream the members of a specific group as each SCIM page arrives."""
         try:
-            members = []
             for member in self._user_client.groups.list_members(group_id):
-                members.append({
+                yield {
                     'id': member.id,
                     'user_name': member.user_name,
                     'display_name': getattr(member, 'display_name', '')
-                })
-            return members
+                }
         except Exception as e:
             logger.error(f"Error fetching group members: {str(e)}")
             raise
     
+    def _with_retries(self, func: Callable, action: str, target_user: str, group_id: str) -> Callable:
+        """Retry a SCIM mutation on throttling, timeouts and transient errors, auditing each retry."""
+        def on_retry(attempt: int, error: Exception):
+            self._audit_log(
+                action=action,
+                target_user=target_user,
+                group_name=group_id,
+                success=False,
+                details={"retry": attempt, "error": str(error)}
+            )
+        return retry_with_backoff(
+            base_delay=0.5, max_delay=8.0, retry_on=TRANSIENT_ERRORS, on_retry=on_retry
+        )(func)
+    
+    def _find_user(self, client: WorkspaceClient, user_email: str) -> Optional[iam.User]:
+        """Look up a user by email with a server-side SCIM filter."""
+        return next(iter(client.users.list(
+            filter=scim_eq("userName", user_email),
+            attributes="id,userName"
+        )), None)
+    
+    @cached_property
+    def _current_user_name(self) -> str:
+        """User name of the current user, fetched once for audit entries."""
+        return self._user_client.current_user.me().user_name
+    
     def _audit_log(self, action: str, target_user: str, group_name: str, success: bool, 
                   details: Optional[Dict] = None):
         """Log an audit event for the action."""
         log_entry = {
             'timestamp': datetime.utcnow().isoformat(),
             'action': action,
-            'executing_user': self._user_client.current_user.me().user_name,
+            'executing_user': self._current_user_name,
             'target_user': target_user,
             'group': group_name,
             'success': success,
             'details': details or {}
         }
-        logger.info(f"AUDIT: {json.dumps(log_entry)}")
+        logger.info("AUDIT", extra={'audit': log_entry})
     
     def add_user_to_group(self, user_email: str, group_id: str) -> bool:
         """Add a user to a group using the service principal."""
         try:
             # First verify the current user has permission to modify this group
             try:
-                self._user_client.groups.get(group_id)
+                self._verify_group_access(group_id)
             except Exception as e:
                 self._audit_log(
                     action="ADD_USER_TO_GROUP",
@@ -107,9 +206,8 @@ class DatabricksGroupService:
             client = self._get_service_principal_client()
             
             # Get or create the user
-            try:
-                user = client.users.get(user_email)
-            except Exception:
+            user = self._find_user(client, user_email)
+            if user is None:
                 # User doesn't exist, create them
                 user = client.users.create(
                     user_name=user_email,
@@ -117,7 +215,9 @@ class DatabricksGroupService:
                 )
             
             # Add user to group
-            client.groups.add_member(
+            add_member = self._with_retries(client.groups.add_member, "ADD_USER_TO_GROUP",
+                                            user_email, group_id)
+            add_member(
                 group_id=group_id,
                 user_name=user_email
             )
@@ -146,7 +246,7 @@ class DatabricksGroupService:
         try:
             # First verify the current user has permission to modify this group
             try:
-                self._user_client.groups.get(group_id)
+                self._verify_group_access(group_id)
             except Exception as e:
                 self._audit_log(
                     action="REMOVE_USER_FROM_GROUP",
@@ -161,10 +261,14 @@ class DatabricksGroupService:
             client = self._get_service_principal_client()
             
             # Get the user ID
-            user = client.users.get(user_email)
+            user = self._find_user(client, user_email)
+            if user is None:
+                raise ValueError(f"User with email '{user_email}' not found")
             
             # Remove user from group
-            client.groups.remove_member(
+            remove_member = self._with_retries(client.groups.remove_member, "REMOVE_USER_FROM_GROUP",
+                                               user_email, group_id)
+            remove_member(
                 group_id=group_id,
                 user_id=user.id
             )
@@ -23,7 +23,7 @@
 # COMMAND ----------
 
 # DBTITLE 1,Install required packages
-# MAGIC %pip install --upgrade databricks-sdk azure-identity azure-keyvault-secrets python-dotenv
+# MAGIC %pip install --upgrade databricks-sdk azure-identity azure-keyvault-secrets python-dotenv pydantic-settings cachetools
 
 # COMMAND ----------
 
@@ -42,7 +42,9 @@ from databricks_service import DatabricksGroupService
 # COMMAND ----------
 
 # DBTITLE 1,Initialize the service
-service = DatabricksGroupService()
+# Reuse the service (and its WorkspaceClients) when this cell is re-run
+if 'service' not in globals():
+    service = DatabricksGroupService()
 
 # COMMAND ----------
 
@@ -105,6 +107,7 @@ def load_groups():
 
 # Initial load of groups
 groups = load_groups()
+group_name_by_id = {g['id']: g['display_name'] for g in groups}
 
 # COMMAND ----------
 
@@ -118,7 +121,7 @@ def on_add_button_clicked(b):
             return
             
         group_id = group_dropdown.value
-        group_name = next((g['display_name'] for g in groups if g['id'] == group_id), group_id)
+        group_name = group_name_by_id.get(group_id, group_id)
         
         print(f"Adding {email} to {group_name}...")
         success = service.add_user_to_group(email, group_id)
@@ -138,7 +141,7 @@ def on_remove_button_clicked(b):
             return
             
         group_id = group_dropdown.value
-        group_name = next((g['display_name'] for g in groups if g['id'] == group_id), group_id)
+        group_name = group_name_by_id.get(group_id, group_id)
         
         print(f"Removing {email} from {group_name}...")
         success = service.remove_user_from_group(email, group_id)
@@ -153,8 +156,9 @@ def on_refresh_button_clicked(b):
     with output:
         clear_output()
         print("Refreshing groups...")
-        global groups
+        global groups, group_name_by_id
         groups = load_groups()
+        group_name_by_id = {g['id']: g['display_name'] for g in groups}
         print(f"Loaded {len(groups)} groups")
 
 # Register button handlers
@@ -204,16 +208,17 @@ def on_view_members_clicked(b):
     with members_output:
         clear_output()
         group_id = group_dropdown.value
-        group_name = next((g['display_name'] for g in groups if g['id'] == group_id), group_id)
+        group_name = group_name_by_id.get(group_id, group_id)
         
         print(f"Loading members of {group_name}...")
         try:
-            members = service.get_group_members(group_id)
-            if members:
-                print(f"\nMembers of {group_name}:")
-                for i, member in enumerate(members, 1):
-                    print(f"{i}. {member['display_name']} ({member['user_name']})")
-            else:
+            # Print members as they arrive instead of waiting for every page
+            count = 0
+            for count, member in enumerate(service.get_group_members(group_id), 1):
+                if count == 1:
+                    print(f"\nMembers of {group_name}:")
+                print(f"{count}. {member['display_name']} ({member['user_name']})")
+            if not count:
                 print(f"No members found in {group_name}")
         except Exception as e:
             print(f"Error loading group members: {str(e)}")
@@ -1,8 +1,19 @@
 """Group management service for Databricks User Group Manager."""
 from databricks.sdk import WorkspaceClient
-from databricks.sdk.service.iam import Group, ComplexValue
-from typing import List, Optional, Dict, Any
+from databricks.sdk.errors import NotFound
+from databricks.sdk.service.iam import Group, ComplexValue, Patch, PatchOp, PatchSchema
+from typing import List, Optional, Dict, Any, Set, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cachetools import TTLCache, cached
 import logging
+import threading
+
+from retry import retry_with_backoff, read_limiter, write_limiter
+from scim import scim_eq
+
+# Manageable groups per user, refreshed every minute
+_manageable_groups_cache = TTLCache(maxsize=4, ttl=60)
+_manageable_groups_lock = threading.RLock()
 
 class GroupManager:
     """Handles group management operations in Databricks."""
@@ -27,6 +38,20 @@ class GroupManager:
             self._service_principal_client = self.auth_service.get_service_principal_client()
         return self._service_principal_client
     
+    @retry_with_backoff()
+    @read_limiter
+    def _list_groups(self) -> List[Group]:
+        """List every group's ID and display name as the current user."""
+        return list(self.user_client.groups.list(attributes="id,displayName", count=200))
+    
+    @retry_with_backoff()
+    @read_limiter
+    def _list_members(self, group_id: str) -> List[Any]:
+        """List the members of a group using the service principal."""
+        return list(self.service_principal_client.groups.list_members(group_id))
+    
+    @cached(_manageable_groups_cache, key=lambda self: self.auth_service.user_id,
+            lock=_manageable_groups_lock)
     def list_manageable_groups(self) -> List[Dict[str, Any]]:
         """
         List all groups that the current user has permission to manage.
@@ -35,11 +60,11 @@ class GroupManager:
             List of group dictionaries with 'id' and 'displayName' keys
         """
         try:
-            all_groups = self.user_client.groups.list(attributes="id,displayName")
+            all_groups = self._list_groups()
             manageable_groups = []
             
             for group in all_groups:
-                if self.auth_service.can_manage_group(self.user_client, group.display_name):
+                if self.auth_service.can_manage_group_id(self.user_client, group.id):
                     manageable_groups.append({
                         'id': group.id,
                         'displayName': group.display_name
@@ -63,15 +88,23 @@ class GroupManager:
         """
         try:
             # First, get the group ID
-            group = next((g for g in self.user_client.groups.list(attributes="id,displayName") 
-                         if g.display_name == group_name), None)
+            group_id = self.auth_service.get_group_id(self.user_client, group_name)
             
-            if not group:
+            if not group_id:
                 self.logger.warning(f"Group '{group_name}' not found")
                 return []
                 
             # Get group members
-            members = self.service_principal_client.groups.list_members(group.id)
+            try:
+                members = self._list_members(group_id)
+            except NotFound:
+                # The remembered ID is stale if the group was recreated under the same name
+                self.auth_service.forget_group_id(group_name)
+                fresh_id = self.auth_service.get_group_id(self.user_client, group_name)
+                if not fresh_id or fresh_id == group_id:
+                    self.logger.warning(f"Group '{group_name}' not found")
+                    return []
+                members = self._list_members(fresh_id)
             
             return [{
                 'id': member.id,
@@ -83,84 +116,207 @@ class GroupManager:
             self.logger.error(f"Failed to get group members for '{group_name}': {str(e)}")
             raise
     
-    def add_user_to_groups(self, user_email: str, group_names: List[str]) -> Dict[str, Any]:
+    @retry_with_backoff()
+    @read_limiter
+    def get_user_memberships(self, user_email: str) -> Tuple[str, Set[str]]:
+        """
+        Resolve a user's ID and group memberships with a single SCIM lookup.
+        
+        Args:
+            user_email: Email of the user
+            
+        Returns:
+            Tuple of the user's ID and the IDs of the groups they are a direct member of
+            
+        Raises:
+            ValueError: If no user has that email
+        """
+        user = next(iter(self.service_principal_client.users.list(
+            filter=scim_eq("userName", user_email),
+            attributes="id,groups"
+        )), None)
+        
+        if not user:
+            raise ValueError(f"User with email '{user_email}' not found")
+            
+        # Inherited memberships can't be changed on the group itself
+        return user.id, {g.value for g in (user.groups or []) if g.type != "indirect"}
+    
+    def get_user_group_ids(self, user_email: str) -> Set[str]:
+        """
+        Get the IDs of all groups a user belongs to with a single SCIM lookup.
+        
+        Args:
+            user_email: Email of the user
+            
+        Returns:
+            Set of IDs of the groups the user is a direct member of
+        """
+        try:
+            return self.get_user_memberships(user_email)[1]
+            
+        except ValueError:
+            self.logger.warning(f"User '{user_email}' not found")
+            return set()
+            
+        except Exception as e:
+            self.logger.error(f"Failed to get groups for user '{user_email}': {str(e)}")
+            raise
+    
+    @retry_with_backoff()
+    @write_limiter
+    def _patch_user(self, user_id: str, operations: List[Patch]):
+        """Send a SCIM PATCH for the given user."""
+        self.service_principal_client.users.patch(
+            id=user_id,
+            operations=operations,
+            schemas=[PatchSchema.URN_IETF_PARAMS_SCIM_API_MESSAGES_2_0_PATCH_OP]
+        )
+    
+    def _apply_membership_changes(
+        self,
+        user_id: str,
+        op: PatchOp,
+        group_ids: List[str],
+        apply_one: Callable[[str], None]
+    ) -> Dict[str, str]:
+        """
+        Apply a membership change for several groups in one PATCH on the user.
+        
+        If the workspace rejects the combined request, falls back to one call
+        per group issued concurrently.
+        
+        Args:
+            user_id: ID of the user whose memberships change
+            op: PatchOp.ADD or PatchOp.REMOVE
+            group_ids: IDs of the groups to change
+            apply_one: Per-group fallback operation, called with the group ID
+            
+        Returns:
+            Dictionary mapping group IDs that failed to the failure reason
+        """
+        if not group_ids:
+            return {}
+            
+        if op == PatchOp.ADD:
+            operations = [Patch(op=op, path="groups", value=[{'value': group_id}])
+                          for group_id in group_ids]
+        else:
+            operations = [Patch(op=op, path=f'groups[{scim_eq("value", group_id)}]')
+                          for group_id in group_ids]
+        
+        try:
+            self._patch_user(user_id, operations)
+            return {}
+        except Exception as e:
+            self.logger.warning(
+                f"Combined membership update for user '{user_id}' rejected, "
+                f"falling back to per-group requests: {str(e)}"
+            )
+        
+        failures = {}
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = {executor.submit(apply_one, group_id): group_id for group_id in group_ids}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures[futures[future]] = str(e)
+        return failures
+    
+    @retry_with_backoff()
+    @write_limiter
+    def _add_one(self, user_email: str, group_id: str):
+        """Add a user to a single group using the service principal."""
+        self.service_principal_client.groups.add_member(
+            group_id=group_id,
+            user_name=user_email
+        )
+    
+    @retry_with_backoff()
+    @write_limiter
+    def _remove_one(self, user_id: str, group_id: str):
+        """Remove a user from a single group using the service principal."""
+        self.service_principal_client.groups.remove_member(
+            group_id=group_id,
+            user_id=user_id
+        )
+    
+    def add_user_to_groups(self, user_email: str, group_ids: List[str]) -> Dict[str, Any]:
         """
         Add a user to one or more groups.
         
         Args:
             user_email: Email of the user to add
-            group_names: List of group names to add the user to
+            group_ids: List of IDs of the groups to add the user to
             
         Returns:
-            Dictionary with operation results
+            Dictionary with operation results, keyed by group ID
         """
         results = {
             'success': [],
             'failed': [],
             'unauthorized': []
         }
+        with _manageable_groups_lock:
+            _manageable_groups_cache.clear()
         
         # First, verify the user exists
         try:
-            user = next((u for u in self.service_principal_client.users.list() 
-                        if u.emails and user_email in [e.value for e in u.emails]), None)
-            
-            if not user:
-                raise ValueError(f"User with email '{user_email}' not found")
+            # The user's ID and current memberships come back with a single lookup
+            user_id, member_group_ids = self.get_user_memberships(user_email)
                 
+            # Groups that passed all checks and still need the change applied
+            pending = []
+            
+            # Verify permission to manage each group
+            manageable_ids = []
+            for group_id in group_ids:
+                # Re-read the permission so a right revoked since the listing is honoured
+                if self.auth_service.can_manage_group_id(self.user_client, group_id, use_cache=False):
+                    manageable_ids.append(group_id)
+                else:
+                    results['unauthorized'].append(group_id)
+            
             # Process each group
-            for group_name in group_names:
-                try:
-                    # Verify permission to manage this group
-                    if not self.auth_service.can_manage_group(self.user_client, group_name):
-                        results['unauthorized'].append(group_name)
-                        continue
-                        
-                    # Get the group
-                    group = next((g for g in self.service_principal_client.groups.list() 
-                                if g.display_name == group_name), None)
-                    
-                    if not group:
-                        results['failed'].append({
-                            'group': group_name,
-                            'reason': 'Group not found'
-                        })
-                        continue
-                    
-                    # Check if user is already in the group
-                    members = self.service_principal_client.groups.list_members(group.id)
-                    if any(m.id == user.id for m in members):
-                        results['success'].append({
-                            'group': group_name,
-                            'status': 'already_member'
-                        })
-                        continue
-                    
-                    # Add user to group using service principal
-                    self.service_principal_client.groups.add_member(
-                        group_id=group.id,
-                        user_name=user_email
-                    )
-                    
+            for group_id in manageable_ids:
+                # Check if user is already in the group
+                if group_id in member_group_ids:
                     results['success'].append({
-                        'group': group_name,
-                        'status': 'added'
+                        'group': group_id,
+                        'status': 'already_member'
                     })
-                    
-                    # Log the action
-                    self.logger.info(
-                        f"User '{user_email}' added to group '{group_name}'. "
-                        f"Action performed by service principal."
-                    )
-                    
-                except Exception as e:
+                    continue
+                
+                pending.append(group_id)
+            
+            # Add user to all pending groups using service principal
+            failures = self._apply_membership_changes(
+                user_id, PatchOp.ADD, pending,
+                lambda group_id: self._add_one(user_email, group_id)
+            )
+            
+            for group_id in pending:
+                if group_id in failures:
                     self.logger.error(
-                        f"Failed to add user '{user_email}' to group '{group_name}': {str(e)}"
+                        f"Failed to add user '{user_email}' to group '{group_id}': {failures[group_id]}"
                     )
                     results['failed'].append({
-                        'group': group_name,
-                        'reason': str(e)
+                        'group': group_id,
+                        'reason': failures[group_id]
                     })
+                    continue
+                    
+                results['success'].append({
+                    'group': group_id,
+                    'status': 'added'
+                })
+                
+                # Log the action
+                self.logger.info(
+                    f"User '{user_email}' added to group '{group_id}'. "
+                    f"Action performed by service principal."
+                )
                     
         except Exception as e:
             self.logger.error(f"Error in add_user_to_groups: {str(e)}")
@@ -168,86 +324,81 @@ class GroupManager:
             
         return results
     
-    def remove_user_from_groups(self, user_email: str, group_names: List[str]) -> Dict[str, Any]:
+    def remove_user_from_groups(self, user_email: str, group_ids: List[str]) -> Dict[str, Any]:
         """
         Remove a user from one or more groups.
         
         Args:
             user_email: Email of the user to remove
-            group_names: List of group names to remove the user from
+            group_ids: List of IDs of the groups to remove the user from
             
         Returns:
-            Dictionary with operation results
+            Dictionary with operation results, keyed by group ID
         """
         results = {
             'success': [],
             'failed': [],
             'unauthorized': []
         }
+        with _manageable_groups_lock:
+            _manageable_groups_cache.clear()
         
         # First, verify the user exists
         try:
-            user = next((u for u in self.service_principal_client.users.list() 
-                        if u.emails and user_email in [e.value for e in u.emails]), None)
-            
-            if not user:
-                raise ValueError(f"User with email '{user_email}' not found")
+            # The user's ID and current memberships come back with a single lookup
+            user_id, member_group_ids = self.get_user_memberships(user_email)
                 
+            # Groups that passed all checks and still need the change applied
+            pending = []
+            
+            # Verify permission to manage each group
+            manageable_ids = []
+            for group_id in group_ids:
+                # Re-read the permission so a right revoked since the listing is honoured
+                if self.auth_service.can_manage_group_id(self.user_client, group_id, use_cache=False):
+                    manageable_ids.append(group_id)
+                else:
+                    results['unauthorized'].append(group_id)
+            
             # Process each group
-            for group_name in group_names:
-                try:
-                    # Verify permission to manage this group
-                    if not self.auth_service.can_manage_group(self.user_client, group_name):
-                        results['unauthorized'].append(group_name)
-                        continue
-                        
-                    # Get the group
-                    group = next((g for g in self.service_principal_client.groups.list() 
-                                if g.display_name == group_name), None)
-                    
-                    if not group:
-                        results['failed'].append({
-                            'group': group_name,
-                            'reason': 'Group not found'
-                        })
-                        continue
-                    
-                    # Check if user is in the group
-                    members = self.service_principal_client.groups.list_members(group.id)
-                    member = next((m for m in members if m.id == user.id), None)
-                    
-                    if not member:
-                        results['success'].append({
-                            'group': group_name,
-                            'status': 'not_in_group'
-                        })
-                        continue
-                    
-                    # Remove user from group using service principal
-                    self.service_principal_client.groups.remove_member(
-                        group_id=group.id,
-                        user_id=user.id
-                    )
-                    
+            for group_id in manageable_ids:
+                # Check if user is in the group
+                if group_id not in member_group_ids:
                     results['success'].append({
-                        'group': group_name,
-                        'status': 'removed'
+                        'group': group_id,
+                        'status': 'not_in_group'
                     })
-                    
-                    # Log the action
-                    self.logger.info(
-                        f"User '{user_email}' removed from group '{group_name}'. "
-                        f"Action performed by service principal."
-                    )
-                    
-                except Exception as e:
+                    continue
+                
+                pending.append(group_id)
+            
+            # Remove user from all pending groups using service principal
+            failures = self._apply_membership_changes(
+                user_id, PatchOp.REMOVE, pending,
+                lambda group_id: self._remove_one(user_id, group_id)
+            )
+            
+            for group_id in pending:
+                if group_id in failures:
                     self.logger.error(
-                        f"Failed to remove user '{user_email}' from group '{group_name}': {str(e)}"
+                        f"Failed to remove user '{user_email}' from group '{group_id}': {failures[group_id]}"
                     )
                     results['failed'].append({
-                        'group': group_name,
-                        'reason': str(e)
+                        'group': group_id,
+                        'reason': failures[group_id]
                     })
+                    continue
+                    
+                results['success'].append({
+                    'group': group_id,
+                    'status': 'removed'
+                })
+                
+                # Log the action
+                self.logger.info(
+                    f"User '{user_email}' removed from group '{group_id}'. "
+                    f"Action performed by service principal."
+                )
                     
         except Exception as e:
             self.logger.error(f"Error in remove_user_from_groups: {str(e)}")
@@ -74,11 +74,15 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- FUNCIONES DE LOGO ---
-def create_logo():
+@st.cache_data
+def create_logo_bytes():
+    # Se genera una sola vez y se reutiliza en cada rerun
     img = Image.new('RGB', (200, 60), color = (59, 130, 246))
     d = ImageDraw.Draw(img)
     d.text((20, 20), "LOGO EMPRESA", fill=(255, 255, 255))
-    return img
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
 
 # --- INICIALIZACIÓN DE ESTADO ---
 if 'page' not in st.session_state:
@@ -90,8 +94,7 @@ if 'page' not in st.session_state:
 col_logo, col_title, col_empty = st.columns([1, 2, 1])
 
 with col_logo:
-    logo = create_logo()
-    st.image(logo, use_container_width=True)
+    st.image(create_logo_bytes(), use_container_width=True)
 
 with col_title:
     st.markdown('<div class="centered-title">Gestión de Usuario</div>', unsafe_allow_html=True)
@@ -0,0 +1,58 @@
+"""Queued logging setup shared by the CLI application and the notebook service."""
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import atexit
+import json
+import logging
+import queue
+import threading
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+class _AuditQueueListener(QueueListener):
+    """Queue listener that serializes audit entries to JSON on its own thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        audit = getattr(record, 'audit', None)
+        if audit is not None:
+            record.msg = f"AUDIT: {json.dumps(audit)}"
+            record.args = None
+        return record
+
+def setup_queued_logging(*handlers: logging.Handler, level: Optional[str] = None):
+    """
+    Write root logger records from a background listener thread.
+
+    Handlers already configured on the root logger (e.g. by the host process)
+    are moved behind the listener together with the given ones, so they keep
+    receiving every record. Calling this again only adds the new handlers.
+
+    Args:
+        handlers: Additional handlers to write records to
+        level: Root logger level, left unchanged when not given
+    """
+    global _listener
+    root = logging.getLogger()
+    with _lock:
+        if _listener is None:
+            existing = list(root.handlers)
+            for handler in existing:
+                root.removeHandler(handler)
+            if not existing and not handlers:
+                # Same default as logging.basicConfig
+                default_handler = logging.StreamHandler()
+                default_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+                existing.append(default_handler)
+
+            log_queue = queue.Queue(-1)
+            _listener = _AuditQueueListener(log_queue, *existing, *handlers,
+                                            respect_handler_level=True)
+            root.addHandler(QueueHandler(log_queue))
+            _listener.start()
+            atexit.register(_listener.stop)
+        elif handlers:
+            _listener.handlers = _listener.handlers + handlers
+
+        if level is not None:
+            root.setLevel(level)
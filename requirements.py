@@ -2,6 +2,8 @@ databricks-sdk>=0.10.0
 azure-identity>=1.12.0
 azure-keyvault-secrets>=4.6.0
 python-dotenv>=0.19.0
-pydantic>=1.10.0
+pydantic>=2.0.0
+pydantic-settings>=2.0.0
 python-dateutil>=2.8.2
 requests>=2.28.0
+cachetools>=5.0.0
@@ -0,0 +1,87 @@
+"""Retry and rate limiting helpers for Databricks API calls."""
+from databricks.sdk.errors import TooManyRequests, TemporarilyUnavailable
+from typing import Callable, Optional, Tuple, Type
+import functools
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def retry_with_backoff(
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    retry_on: Tuple[Type[Exception], ...] = (TooManyRequests, TemporarilyUnavailable),
+    on_retry: Optional[Callable[[int, Exception], None]] = None
+):
+    """
+    Retry a call on rate limiting or transient unavailability.
+
+    Waits for the server-provided Retry-After when there is one, otherwise
+    backs off exponentially with jitter.
+
+    Args:
+        max_retries: Number of retries before giving up
+        base_delay: Delay in seconds before the first retry
+        max_delay: Upper bound for a single delay in seconds
+        retry_on: Exception types that trigger a retry
+        on_retry: Called with the attempt number and error before each retry
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except retry_on as e:
+                    if attempt == max_retries:
+                        raise
+                    delay = getattr(e, 'retry_after_secs', None)
+                    if not delay:
+                        delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                    logger.warning(
+                        f"{func.__name__} failed transiently ({str(e)}), "
+                        f"retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})"
+                    )
+                    if on_retry is not None:
+                        on_retry(attempt + 1, e)
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+class RateLimiter:
+    """Thread-safe token bucket allowing at most `rate` calls per second."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def __call__(self, func: Callable) -> Callable:
+        """Use the limiter as a decorator."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.acquire()
+            return func(*args, **kwargs)
+        return wrapper
+
+# SCIM read endpoints tolerate roughly 30 req/s, mutations roughly 10 req/s
+read_limiter = RateLimiter(30)
+write_limiter = RateLimiter(10)
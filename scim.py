@@ -0,0 +1,15 @@
+"""Helpers for building SCIM requests."""
+
+def scim_eq(attr: str, value: str) -> str:
+    """
+    Build a SCIM `eq` filter with the value quoted and escaped.
+
+    Args:
+        attr: Attribute to compare, e.g. 'userName'
+        value: Value to match
+
+    Returns:
+        Filter string such as 'userName eq "user@example.com"'
+    """
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+    return f'{attr} eq "{escaped}"'